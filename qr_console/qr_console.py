@@ -3,18 +3,71 @@ module provides a console application builder based on argparse library
 """
 
 import argparse
-import re
+import asyncio
+import inspect
+import keyword
+import shlex
+import unicodedata
 
 import colorama
 from colorama import Fore, Style
 import sys
 
 
-colorama.init()
+_colorama_inited = False
+_HELP_FLAGS = frozenset(('-h', '--help'))
+_SHLEX_SPECIAL_CHARS = frozenset('"\'\\')
+# characters 'str.split()' splits on; shlex is given the same set so both tokenizing paths agree
+_WHITESPACE = ''.join(chr(c) for c in range(0x3001) if chr(c).isspace())    # U+3000 is the last one
+_ERR_PREFIX, _ERR_SUFFIX = Fore.RED, Style.RESET_ALL
+_PROMPT = '?>'
+_FAST_PATH_KWARGS = frozenset(('type', 'help', 'metavar'))
+
+
+def _ensure_color():
+    """initialize colorama before the first colored output; a real terminal on non-Windows platforms
+    understands ANSI codes as is, so the stream wrapper is only installed for Windows or redirected output"""
+    global _colorama_inited
+    if not _colorama_inited:
+        if sys.platform == 'win32' or not sys.stderr.isatty():
+            colorama.init()
+        _colorama_inited = True
+
+
+def _build_dispatcher(arg_names, func):
+    """build a function taking parsed namespace and calling 'func' with its 'arg_names' attributes as arguments;
+    when all names are plain identifiers, the call is compiled as direct attribute loads, like 'f(d.a, d.b)';
+    names changed by NFKC normalization (which Python applies to identifiers in source) are not compiled"""
+    if all(name.isidentifier() and not keyword.iskeyword(name) and unicodedata.normalize('NFKC', name) == name
+           for name in arg_names):
+        src = 'def _call(d, _f=f): return _f(' + ', '.join('d.' + name for name in arg_names) + ')'
+        ns = {'f': func}
+        exec(src, ns)
+        return ns['_call']
+
+    # names like 'a.b' or 'my-arg' are only reachable through namespace dict
+    return lambda data: func(*[vars(data)[name] for name in arg_names])
+
+
+def _run_awaitable(aw):
+    """run awaitable returned by a command from synchronous code; impossible inside a running event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_await(aw))
+
+    if asyncio.iscoroutine(aw):
+        aw.close()
+    raise RuntimeError("async command can't be run by 'run()' inside a running event loop; "
+                       "use 'await console.run_async()' instead")
+
+
+async def _await(aw):
+    return await aw
 
 
 class QRHelpAction(argparse.Action):
-    """redefining help action from argparse module to avoid finishing app after help message"""
+    """help action which, unlike argparse one, does not finish app after help message"""
     def __init__(self,
                  option_strings,
                  dest=argparse.SUPPRESS,
@@ -31,13 +84,15 @@ class QRHelpAction(argparse.Action):
         parser.print_help()
 
 
-argparse._HelpAction = QRHelpAction
-
-
 class ThrowingArgumentParser(argparse.ArgumentParser):
     class ArgumentParserError(Exception):
         pass
 
+    def __init__(self, *args, add_help=True, **kwargs):
+        super().__init__(*args, add_help=False, **kwargs)
+        if add_help:
+            self.add_argument('-h', '--help', action=QRHelpAction, help='show this help message')
+
     def error(self, message):
         raise self.ArgumentParserError(message)
 
@@ -45,7 +100,7 @@ class ThrowingArgumentParser(argparse.ArgumentParser):
 class QRCommand:
     def __init__(self, name: str, func=None, help: str = None):
         self.name, self.help = name, help
-        self.arguments = dict()
+        self.arguments = []
         self.func = func
 
     def add_argument(self, name, *args, **kwargs):
@@ -59,16 +114,16 @@ class QRCommand:
         if not provided, full form will be used for short one and vice versa.
         """
 
-        if name[0] != '-':
+        if not name.startswith('-'):
             bare_name = name
         else:
-            bare_name = name[2:] if name[:2] == '--' else name[1:]
+            bare_name = name.lstrip('-')
             short_name = '-' + bare_name
             full_name = '--' + bare_name
 
             args = [short_name, full_name] + list(args)     # if other names are given, they'll overwrite these
 
-        self.arguments[bare_name] = [[name] + list(args), kwargs]
+        self.arguments.append((bare_name, [name] + list(args), kwargs))
         return self
 
     def set_func(self, f):
@@ -105,27 +160,51 @@ class QRConsole:
         self.parser = ThrowingArgumentParser(prog='PROG')
         self.subparsers = self.parser.add_subparsers()
         self.commands = []
+        self.__positional_commands = dict()
+        self.__subparsers_map = dict()
 
         self.hello = hello
         self.__print_hello()
         self.throw_errors = throw_errors
 
     def run(self):
+        """blocking console loop; awaitables returned by commands are run to completion with 'asyncio.run'"""
+        reader = self.__read_tty if sys.stdin.isatty() else self.__read_stream
+        while True:
+            try:
+                self.__read_line(reader)
+            except EOFError:
+                return
+
+    async def run_async(self):
+        """console loop for use inside a running event loop: input is read in a worker thread,
+        coroutine commands are awaited, so other tasks (or other consoles) keep running. Example:
+        console.add_command(QRCommand('wait', asyncio.sleep).add_argument('delay', type=float))
+        await console.run_async()
+        """
+        reader = self.__read_tty if sys.stdin.isatty() else self.__read_stream
         while True:
-            self.__read_line()
+            try:
+                await self.__read_line_async(reader)
+            except EOFError:
+                return
 
     def add_command(self, cmd: QRCommand):
         if cmd.func is None:
             raise Exception(f'command \'{cmd.name}\' has no function set!')
 
         parser = self.subparsers.add_parser(name=cmd.name, prog=cmd.name, help=cmd.help)
-        for args, kwargs in cmd.arguments.values():
+        self.__subparsers_map[cmd.name] = parser
+        for _, args, kwargs in cmd.arguments:
             parser.add_argument(*args, **kwargs)
 
-        def extract_args(data):
-            return [data.__dict__[arg] for arg in cmd.arguments.keys()]
+        arg_names = tuple(bare_name for bare_name, _, _ in cmd.arguments)
+        parser.set_defaults(func=_build_dispatcher(arg_names, cmd.func))
 
-        parser.set_defaults(func=lambda data: cmd.func(*extract_args(data)))
+        if all(not args[0].startswith('-') and _FAST_PATH_KWARGS.issuperset(kwargs) and callable(kwargs.get('type', str))
+               for _, args, kwargs in cmd.arguments):
+            types = tuple(kwargs.get('type', str) for _, _, kwargs in cmd.arguments)
+            self.__positional_commands[cmd.name] = (cmd.func, types)
 
         self.commands.append(cmd)
 
@@ -135,35 +214,90 @@ class QRConsole:
         print("Type '-h' or '--help' to get more info")
         print("Enter commands:")
 
-    def __read_line(self):
-        is_help = None
+    @staticmethod
+    def __read_tty():
+        return input(_PROMPT)
+
+    @staticmethod
+    def __read_stream():
+        """read line from piped input, avoiding readline machinery of 'input'"""
+        sys.stdout.write(_PROMPT)
+        sys.stdout.flush()
+        line = sys.stdin.readline()
+        if not line:
+            raise EOFError
+        return line
+
+    def __read_line(self, reader):
+        line = reader()
+        try:
+            result = self.__execute(line)
+            if inspect.isawaitable(result):
+                _run_awaitable(result)
+        except Exception as ex:
+            self.__report_error(ex)
+
+    async def __read_line_async(self, reader):
+        line = await asyncio.get_running_loop().run_in_executor(None, reader)
         try:
-            s = self.extract_args(input('?>'))
-            is_help = ('-h' in s) or ('--help' in s)
-            args = self.parser.parse_args(s)
-            if args.__contains__('func') and not is_help:
-                args.func(args)
+            result = self.__execute(line)
+            if inspect.isawaitable(result):
+                await result
         except Exception as ex:
-            if not is_help:
-                print(Fore.RED + str(ex))
-                print(Style.RESET_ALL, end='')
-                if self.throw_errors:
-                    sys.exit(1)
+            self.__report_error(ex)
+
+    def __execute(self, line):
+        """parse line and call the command; returns whatever command function returned"""
+        is_help = None
+        try:
+            s = self.extract_args(line)
+            is_help = not _HELP_FLAGS.isdisjoint(s)
+            positional = self.__match_positional(s)
+            if positional is not None:
+                func, values = positional
+                return func(*values)
+            sub = self.__subparsers_map.get(s[0]) if s else None
+            args = sub.parse_args(s[1:]) if sub else self.parser.parse_args(s)
+        except Exception:
+            if is_help:
+                return None     # help message is already printed
+            raise
+
+        func = getattr(args, 'func', None)
+        if func is not None and not is_help:
+            return func(args)
+        return None
+
+    def __report_error(self, ex):
+        _ensure_color()
+        sys.stderr.write(f'{_ERR_PREFIX}{ex}{_ERR_SUFFIX}\n')
+        if self.throw_errors:
+            sys.exit(1)
+
+    def __match_positional(self, s):
+        """match a command with positional-only arguments to call it directly, bypassing argparse;
+        returns (func, values) or None if the line has to go through the parser (options given,
+        wrong arguments count, bad values)"""
+        command = self.__positional_commands.get(s[0]) if s else None
+        if command is None or len(s) - 1 != len(command[1]) or any(x.startswith('-') for x in s):
+            return None
+
+        func, types = command
+        try:
+            return func, [t(x) for t, x in zip(types, s[1:])]
+        except (TypeError, ValueError, argparse.ArgumentTypeError):
+            return None     # argparse will report the error in its own format
 
     def extract_args(self, s):
-        p = r'\"([A-Za-z0-9а-яА-Я_ -]+)\"'
-        b_args = ['"' + x + '"' for x in re.findall(p, s)]
-        fill = f'$^$$^$'
-        for i in range(len(b_args)):
-            s = s.replace(b_args[i], fill)
-
-        args = s.split()
-        i = 0
-        for j in range(len(args)):
-            if args[j] == fill:
-                args[j] = b_args[i][1:-1]
-                i += 1
-        return args
+        """split line into tokens with shell-like syntax: quoted text is kept as a single token"""
+        if _SHLEX_SPECIAL_CHARS.isdisjoint(s):
+            return s.split()  # nothing to unquote or unescape
+        lexer = shlex.shlex(s, posix=True)
+        lexer.whitespace, lexer.whitespace_split, lexer.commenters = _WHITESPACE, True, ''
+        try:
+            return list(lexer)
+        except ValueError as ex:
+            raise ThrowingArgumentParser.ArgumentParserError(str(ex))
 
 
 if __name__ == '__main__':
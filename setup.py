@@ -14,10 +14,10 @@ setuptools.setup(
     packages=setuptools.find_packages(),
     install_requires=required,
     classifiers=[
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     long_description='''
 # qr_console
 
@@ -56,7 +56,7 @@ positional arguments:
     one          change value by 1
 
 optional arguments:
-  -h, --help     show this help message and exit
+  -h, --help     show this help message
 ?>add -h
 usage: add [-h] a b
 
@@ -65,7 +65,7 @@ positional arguments:
   b           2nd arg
 
 optional arguments:
-  -h, --help  show this help message and exit
+  -h, --help  show this help message
 ?>one --help
 usage: one [-h] [-i] v
 
@@ -73,7 +73,7 @@ positional arguments:
   v
 
 optional arguments:
-  -h, --help           show this help message and exit
+  -h, --help           show this help message
   -i, --i, --flag  set to inc; default is dec
 ?>add 1 2
 3